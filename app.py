@@ -1,8 +1,13 @@
 import streamlit as st
 import os
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embedding_server import encode
+from vector_store import (
+    save_snapshot, load_snapshot, current_version, add_tombstones, load_tombstones,
+    remove_tombstones, search_snapshot, compact_in_background, import_legacy,
+    process_memory, format_memory
+)
+from dedup import NearDuplicateFilter, file_digest
 from pypdf import PdfReader
 import time
 
@@ -16,18 +21,11 @@ st.set_page_config(
 
 DATA_DIR = "data/pdfs"
 INDEX_DIR = "index"
-INDEX_PATH = "index/faiss_index.bin"
+LEGACY_INDEX_PATH = "index/faiss_index.bin"
 
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(INDEX_DIR, exist_ok=True)
 
-# ===================== LOAD MODEL =====================
-@st.cache_resource
-def load_model():
-    return SentenceTransformer("all-MiniLM-L6-v2")
-
-model = load_model()
-
 # ===================== UI STYLE =====================
 st.markdown("""
 <style>
@@ -64,9 +62,48 @@ st.markdown("""
 
 # ===================== FUNCTIONS =====================
 
+def pdf_listing():
+    # Newest upload first, so the latest copy of a re-saved PDF is the one kept
+    listing = []
+    for file in os.listdir(DATA_DIR):
+        if file.endswith(".pdf"):
+            stat = os.stat(os.path.join(DATA_DIR, file))
+            listing.append((file, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(listing, key=lambda f: (f[1], f[0]), reverse=True))
+
+@st.cache_data(max_entries=1)
+def load_pdfs_cached(listing, tombstones):
+    texts = []
+    sources = []
+    keys = []
+    seen_files = set()
+    near_dups = NearDuplicateFilter()
+    for file, _, _ in listing:
+        if file in tombstones:
+            continue
+        path = os.path.join(DATA_DIR, file)
+        digest = file_digest(path)
+        if digest in seen_files:
+            continue
+        seen_files.add(digest)
+
+        reader = PdfReader(path)
+        for page_num, page in enumerate(reader.pages):
+            text = page.extract_text()
+            if text and not near_dups.is_duplicate(text):
+                texts.append(text)
+                sources.append(f"{file} — Page {page_num+1}")
+                keys.append(file)
+    return texts, sources, keys
+
 def load_pdfs():
+    return load_pdfs_cached(pdf_listing(), load_tombstones(INDEX_DIR))
+
+def load_legacy_pdfs():
+    # Row order of the pre-snapshot faiss_index.bin: os.listdir order, no dedup
     texts = []
     sources = []
+    keys = []
     for file in os.listdir(DATA_DIR):
         if file.endswith(".pdf"):
             reader = PdfReader(os.path.join(DATA_DIR, file))
@@ -75,34 +112,38 @@ def load_pdfs():
                 if text:
                     texts.append(text)
                     sources.append(f"{file} — Page {page_num+1}")
-    return texts, sources
+                    keys.append(file)
+    return texts, sources, keys
 
-def build_index(texts):
-    embeddings = model.encode(texts)
+def build_index(texts, sources, keys):
+    import faiss
+
+    embeddings = encode(texts)
     dim = embeddings.shape[1]
     index = faiss.IndexFlatL2(dim)
     index.add(np.array(embeddings).astype("float32"))
-    faiss.write_index(index, INDEX_PATH)
+    save_snapshot(INDEX_DIR, index, texts, sources, keys, note=f"build of {len(set(keys))} PDFs")
     return len(texts)
 
+@st.cache_resource(max_entries=1)
+def load_cached_index(version):
+    return load_snapshot(INDEX_DIR, version)
+
 def load_index():
-    if os.path.exists(INDEX_PATH):
-        return faiss.read_index(INDEX_PATH)
+    version = current_version(INDEX_DIR)
+    if version is not None:
+        return load_cached_index(version)
     return None
 
-def search_index(query, texts, sources, k=3):
-    index = load_index()
-    if index is None:
+def search_index(query, k=3):
+    snapshot = load_index()
+    if snapshot is None:
         return []
 
-    q_emb = model.encode([query]).astype("float32")
-    D, I = index.search(q_emb, k)
+    q_emb = encode([query])
+    rows = search_snapshot(snapshot, q_emb, k)
 
-    results = []
-    for idx in I[0]:
-        if idx < len(texts):
-            results.append((texts[idx], sources[idx]))
-    return results
+    return [(snapshot["documents"][i], snapshot["sources"][i]) for i in rows]
 
 def format_clinical_output(query, results):
     output = f"## 🧠 Clinical Answer for: {query}\n\n"
@@ -132,7 +173,8 @@ menu = st.sidebar.radio(
 )
 
 # ===================== LOAD DATA =====================
-texts_cache, sources_cache = load_pdfs()
+import_legacy(INDEX_DIR, LEGACY_INDEX_PATH, load_legacy_pdfs)
+texts_cache, sources_cache, _ = load_pdfs()
 total_pdfs = len(os.listdir(DATA_DIR))
 indexed_pages = len(texts_cache)
 
@@ -168,13 +210,12 @@ elif menu == "🔍 Clinical AI Console":
     query = st.text_area("Ask a clinical or hospital question", height=120)
 
     if st.button("🚀 Run Clinical Intelligence"):
-        if not os.path.exists(INDEX_PATH):
+        if current_version(INDEX_DIR) is None:
             st.error("Evidence Index not built. Please build it first from PDF Knowledge page.")
         else:
             with st.spinner("Searching hospital evidence..."):
                 time.sleep(1)
-                texts, sources = load_pdfs()
-                results = search_index(query, texts, sources)
+                results = search_index(query)
 
             st.success("Clinical Evidence Found")
 
@@ -195,18 +236,31 @@ elif menu == "📁 PDF Knowledge":
         for pdf in uploaded_files:
             with open(os.path.join(DATA_DIR, pdf.name), "wb") as f:
                 f.write(pdf.getbuffer())
+            # Uploading a withdrawn PDF again is the only way to bring it back
+            remove_tombstones(INDEX_DIR, [pdf.name])
             st.success(f"Saved: {pdf.name}")
 
     st.divider()
 
     if st.button("🧠 Build Evidence Index"):
         with st.spinner("Building hospital knowledge index..."):
-            texts, _ = load_pdfs()
-            pages = build_index(texts)
+            texts, sources, keys = load_pdfs()
+            pages = build_index(texts, sources, keys)
 
         st.success("Evidence Index Built Successfully!")
         st.info(f"Indexed Pages: {pages}")
 
+    st.divider()
+
+    pdf_files = sorted(f for f in os.listdir(DATA_DIR) if f.endswith(".pdf"))
+    withdrawn = st.selectbox("Withdraw a PDF (removed from search immediately)", [""] + pdf_files)
+
+    if st.button("🗑 Withdraw PDF") and withdrawn:
+        add_tombstones(INDEX_DIR, [withdrawn])
+        os.remove(os.path.join(DATA_DIR, withdrawn))
+        compact_in_background(INDEX_DIR)
+        st.success(f"Withdrawn: {withdrawn}")
+
     st.divider()
     st.write("📚 Knowledge Base Status")
     st.success(f"{total_pdfs} PDFs available")
@@ -221,6 +275,7 @@ elif menu == "⚙ System Health":
     st.success("Evidence Index: Ready")
     st.success("Clinical Engine: Online")
     st.success("AI Core: Stable")
+    st.info(f"Process Memory: {format_memory(process_memory())}")
 
     st.write("AI Performance")
     st.progress(95)
@@ -0,0 +1,134 @@
+import os
+import re
+import zlib
+import hashlib
+import numpy as np
+
+# Deduplication applied in a single streaming pass before encoding.
+#
+# - PubMed / trials records: exact dedup by PMID / NCT ID, newest file wins
+# - PDF pages: MinHash + LSH near-duplicate detection
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 5
+NEAR_DUP_THRESHOLD = 0.9
+
+# Ingest scripts name files <prefix>_<YYYYMMDD>[_<HHMMSS>][_p<page>].<ext>
+_FETCH_STAMP = re.compile(r"_(\d{8})(?:_(\d{6}))?(?:_p\d+)?\.\w+$")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def fetch_stamp(path):
+    """Fetch date/time encoded in an ingested file name, or "" if it has none."""
+    match = _FETCH_STAMP.search(os.path.basename(path))
+    if not match:
+        return ""
+    return match.group(1) + (match.group(2) or "000000")
+
+
+def files_oldest_first(data_dir, suffix):
+    """Data files ordered by fetch date, so later files override earlier ones.
+
+    The date in the file name survives copies and restores, which reset mtime;
+    mtime only breaks ties.
+    """
+    paths = [
+        os.path.join(data_dir, f)
+        for f in os.listdir(data_dir)
+        if f.endswith(suffix)
+    ]
+    return sorted(paths, key=lambda p: (fetch_stamp(p), os.path.getmtime(p), p))
+
+
+def newest_by_key(records):
+    """Keep the last (newest) record per key from (key, document, source) tuples.
+
+    Records without a key are always kept. Returns documents, sources, keys and
+    the number of duplicates dropped.
+    """
+    keyed = {}
+    unkeyed = []
+    total = 0
+
+    for key, doc, source in records:
+        total += 1
+        if key:
+            keyed[key] = (key, doc, source)
+        else:
+            unkeyed.append((key, doc, source))
+
+    kept = list(keyed.values()) + unkeyed
+    keys = [key for key, _, _ in kept]
+    documents = [doc for _, doc, _ in kept]
+    sources = [source for _, _, source in kept]
+    return documents, sources, keys, total - len(kept)
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ===================== MINHASH / LSH =====================
+
+def _shingles(text, size=SHINGLE_SIZE):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateFilter:
+    """Streaming MinHash/LSH filter: is_duplicate() remembers every text it accepts."""
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+
+    def signature(self, text):
+        shingles = _shingles(text)
+        if not shingles:
+            return None
+
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        # (a * x + b) mod p over all permutations; values stay below 2**64
+        permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(_MERSENNE_PRIME)
+        return (permuted & np.uint64(_MAX_HASH)).min(axis=0)
+
+    def _band_keys(self, sig):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def is_duplicate(self, text):
+        sig = self.signature(text)
+        if sig is None:
+            return False
+
+        candidates = set()
+        for band, key in self._band_keys(sig):
+            candidates.update(self.buckets[band].get(key, ()))
+
+        for idx in candidates:
+            if np.mean(self.signatures[idx] == sig) >= self.threshold:
+                return True
+
+        idx = len(self.signatures)
+        self.signatures.append(sig)
+        for band, key in self._band_keys(sig):
+            self.buckets[band].setdefault(key, []).append(idx)
+        return False
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import queue
+import base64
+import socket
+import threading
+import socketserver
+import numpy as np
+from encoders import MODEL_NAME, get_encoder
+
+# Shared embedding service: one MiniLM copy per host.
+#
+#   python embedding_server.py
+#
+# Pages and indexers call encode() below, which talks to the server over
+# localhost and falls back to an in-process model if it is not running.
+
+HOST = os.getenv("MEDCOPILOT_EMBED_HOST", "127.0.0.1")
+PORT = int(os.getenv("MEDCOPILOT_EMBED_PORT", "8765"))
+
+BATCH_WINDOW_MS = float(os.getenv("MEDCOPILOT_EMBED_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.getenv("MEDCOPILOT_EMBED_MAX_BATCH", "64"))
+CONNECT_TIMEOUT = 0.5
+READ_TIMEOUT = float(os.getenv("MEDCOPILOT_EMBED_TIMEOUT", "30"))
+RETRY_DELAYS = (0.05, 0.2)
+SERVER_RETRY_AFTER = 30.0
+
+
+# ===================== WIRE FORMAT =====================
+
+def pack_embeddings(embeddings):
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    return {
+        "shape": list(embeddings.shape),
+        "data": base64.b64encode(embeddings.tobytes()).decode("ascii")
+    }
+
+
+def unpack_embeddings(payload):
+    data = base64.b64decode(payload["data"])
+    return np.frombuffer(data, dtype="float32").reshape(payload["shape"])
+
+
+# ===================== SERVER =====================
+
+class MicroBatcher:
+    """Collects texts from concurrent requests and encodes them together."""
+
+    def __init__(self, model, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.pending = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, texts):
+        # Large requests go through in max_batch chunks, one at a time, so
+        # queries from other pages can be batched in between
+        results = []
+        for start in range(0, len(texts), self.max_batch):
+            job = {
+                "texts": texts[start:start + self.max_batch],
+                "done": threading.Event(),
+                "result": None,
+                "error": None
+            }
+            self.pending.put(job)
+            job["done"].wait()
+            if job["error"] is not None:
+                raise job["error"]
+            results.append(job["result"])
+
+        if not results:
+            return np.zeros((0, 0), dtype="float32")
+        return np.vstack(results)
+
+    def _collect(self):
+        jobs = [self.pending.get()]
+        count = len(jobs[0]["texts"])
+        deadline = time.monotonic() + self.window
+
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            count += len(job["texts"])
+
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect()
+            texts = [t for job in jobs for t in job["texts"]]
+
+            try:
+                embeddings = self.model.encode(texts, batch_size=self.max_batch)
+                embeddings = np.asarray(embeddings, dtype="float32")
+            except Exception as e:
+                for job in jobs:
+                    job["error"] = e
+                    job["done"].set()
+                continue
+
+            start = 0
+            for job in jobs:
+                end = start + len(job["texts"])
+                job["result"] = embeddings[start:end]
+                job["done"].set()
+                start = end
+
+
+class EmbeddingRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                embeddings = self.server.batcher.submit(request["texts"])
+                response = pack_embeddings(embeddings)
+            except Exception as e:
+                response = {"error": str(e)}
+
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class EmbeddingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Many pages connect at once; the socketserver default backlog of 5 drops them
+    request_queue_size = 256
+
+    def __init__(self, batcher, host=HOST, port=PORT):
+        super().__init__((host, port), EmbeddingRequestHandler)
+        self.batcher = batcher
+
+
+def serve(host=HOST, port=PORT):
+    model = get_encoder()
+    print(f"🧠 Loaded embedding model: {MODEL_NAME} ({model.name} backend)")
+    batcher = MicroBatcher(model)
+
+    with EmbeddingServer(batcher, host, port) as server:
+        print(f"✅ Embedding server listening on {host}:{port} "
+              f"(window {BATCH_WINDOW_MS}ms, max batch {MAX_BATCH_SIZE})")
+        server.serve_forever()
+
+
+# ===================== CLIENT =====================
+
+_local_model = None
+_local_lock = threading.Lock()
+_server_down_until = 0.0
+
+
+def _encode_local(texts):
+    global _local_model
+    with _local_lock:
+        if _local_model is None:
+            _local_model = get_encoder()
+    return _local_model.encode(texts)
+
+
+def _connect():
+    # Host/port are read at call time so they can be overridden after import
+    sock = socket.create_connection((HOST, PORT), timeout=CONNECT_TIMEOUT)
+    sock.settimeout(READ_TIMEOUT)
+    return sock, sock.makefile("rb")
+
+
+def _close(conn):
+    sock, reader = conn
+    reader.close()
+    sock.close()
+
+
+def _encode_remote(texts, chunks):
+    """Encode texts on the server one max_batch chunk at a time, appending to chunks.
+
+    One request per chunk keeps every reply within READ_TIMEOUT. A failed chunk
+    is retried on a fresh connection after each of RETRY_DELAYS; chunks that
+    already came back are kept, so a retry never re-sends them.
+    """
+    conn = None
+    try:
+        for start in range(0, max(len(texts), 1), MAX_BATCH_SIZE):
+            request = {"texts": texts[start:start + MAX_BATCH_SIZE]}
+
+            for delay in RETRY_DELAYS + (None,):
+                try:
+                    if conn is None:
+                        conn = _connect()
+                    sock, reader = conn
+                    sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+                    response = json.loads(reader.readline())
+                    break
+                except (OSError, ValueError):
+                    # A late reply would arrive out of order, so never reuse the connection
+                    if conn:
+                        _close(conn)
+                    conn = None
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+
+            if "error" in response:
+                raise RuntimeError(f"Embedding server error: {response['error']}")
+            chunks.append(unpack_embeddings(response))
+    finally:
+        if conn:
+            _close(conn)
+
+
+def encode(texts):
+    """Embed a list of texts as a float32 array, via the shared server if running."""
+    global _server_down_until
+    texts = list(texts)
+    chunks = []
+
+    if time.monotonic() >= _server_down_until:
+        try:
+            _encode_remote(texts, chunks)
+            return np.vstack(chunks)
+        except (OSError, ValueError):
+            _server_down_until = time.monotonic() + SERVER_RETRY_AFTER
+
+    # Only the texts the server did not get to are encoded locally
+    done = sum(len(chunk) for chunk in chunks)
+    local = _encode_local(texts[done:])
+    return np.vstack(chunks + [local]) if chunks else local
+
+
+if __name__ == "__main__":
+    serve()
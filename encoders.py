@@ -0,0 +1,195 @@
+import os
+import numpy as np
+
+# Pluggable sentence encoders for MiniLM.
+#
+#   MEDCOPILOT_ENCODER=torch   sentence-transformers / PyTorch (default)
+#   MEDCOPILOT_ENCODER=onnx    ONNX Runtime, int8 dynamically quantized, CPU
+#                              (pip install -r requirements-onnx.txt)
+#
+# Heavy libraries (torch, transformers, onnxruntime) are imported on first use
+# so importing this module costs nothing.
+#
+#   python encoders.py            export + quantize the ONNX model (once per host)
+#   python encoders.py --parity   compare ONNX embeddings against PyTorch
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+MAX_SEQ_LENGTH = 256
+
+ONNX_DIR = os.getenv("MEDCOPILOT_ONNX_DIR", "models/onnx")
+ONNX_FP32_PATH = os.path.join(ONNX_DIR, f"{MODEL_NAME}.onnx")
+ONNX_INT8_PATH = os.path.join(ONNX_DIR, f"{MODEL_NAME}.int8.onnx")
+
+DEFAULT_BACKEND = os.getenv("MEDCOPILOT_ENCODER", "torch")
+
+
+class TorchEncoder:
+    name = "torch"
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_NAME)
+
+    def encode(self, texts, batch_size=16):
+        embeddings = self.model.encode(list(texts), batch_size=batch_size)
+        return np.asarray(embeddings, dtype="float32")
+
+
+def export_onnx(fp32_path=ONNX_FP32_PATH, int8_path=ONNX_INT8_PATH):
+    """Export MiniLM to ONNX and write an int8 dynamically quantized copy."""
+    import inspect
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    bert = AutoModel.from_pretrained(HF_MODEL_ID)
+    bert.eval()
+
+    class HiddenStates(torch.nn.Module):
+        # Keyword call: newer transformers reorder forward()'s positional args
+        def __init__(self, bert):
+            super().__init__()
+            self.bert = bert
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.bert(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    model = HiddenStates(bert)
+
+    sample = tokenizer(["MedCopilot export sample"], return_tensors="pt")
+    axes = {0: "batch", 1: "sequence"}
+
+    # Newer torch defaults to the dynamo exporter, which needs onnxscript
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+
+    # Write to temp names and rename, so readers never see a half-written model
+    fp32_tmp = f"{fp32_path}.{os.getpid()}.tmp"
+    int8_tmp = f"{int8_path}.{os.getpid()}.tmp"
+
+    print(f"📦 Exporting {HF_MODEL_ID} to ONNX: {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_tmp,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": axes,
+                "attention_mask": axes,
+                "token_type_ids": axes,
+                "last_hidden_state": axes
+            },
+            opset_version=14,
+            **export_kwargs
+        )
+    os.replace(fp32_tmp, fp32_path)
+
+    print(f"📦 Quantizing to int8: {int8_path}")
+    quantize_dynamic(fp32_path, int8_tmp, weight_type=QuantType.QInt8)
+    os.replace(int8_tmp, int8_path)
+    return int8_path
+
+
+class OnnxEncoder:
+    name = "onnx"
+
+    def __init__(self, model_path=ONNX_INT8_PATH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        # Exporting loads torch, so it is never done implicitly inside a page
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}. Run 'python encoders.py' once to export it."
+            )
+
+        self.tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts):
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np"
+        )
+        feeds = {k: v.astype("int64") for k, v in tokens.items() if k in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+
+        # Same head as the sentence-transformers pipeline: mean pooling + L2 norm
+        mask = tokens["attention_mask"][..., None].astype("float32")
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def encode(self, texts, batch_size=16):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 384), dtype="float32")
+
+        batches = [
+            self._encode_batch(texts[i:i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ]
+        return np.vstack(batches).astype("float32")
+
+
+BACKENDS = {
+    "torch": TorchEncoder,
+    "onnx": OnnxEncoder
+}
+
+
+def get_encoder(backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
+
+
+def check_parity(min_cosine=0.99, model_path=ONNX_INT8_PATH):
+    texts = [
+        "Metformin as first-line therapy for type 2 diabetes mellitus",
+        "Phase III randomized trial of pembrolizumab in non-small cell lung cancer",
+        "Hospital protocol for sepsis management within the first hour",
+        "Adverse events of ACE inhibitors in elderly patients with heart failure"
+    ]
+
+    reference = TorchEncoder().encode(texts)
+    candidate = OnnxEncoder(model_path).encode(texts)
+
+    cosines = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+
+    for text, cos in zip(texts, cosines):
+        print(f"{cos:.4f}  {text}")
+
+    worst = float(cosines.min())
+    if worst < min_cosine:
+        raise AssertionError(f"ONNX/PyTorch parity failed: min cosine {worst:.4f} < {min_cosine}")
+
+    print(f"✅ ONNX int8 parity OK (min cosine {worst:.4f})")
+    return worst
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--parity" in sys.argv:
+        check_parity()
+    else:
+        export_onnx()
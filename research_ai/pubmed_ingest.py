@@ -1,4 +1,6 @@
 import os
+import time
+import threading
 import requests
 import xml.etree.ElementTree as ET
 from datetime import datetime
@@ -6,44 +8,108 @@ from datetime import datetime
 SAVE_DIR = "research_ai/data/pubmed"
 os.makedirs(SAVE_DIR, exist_ok=True)
 
-PUBMED_SEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-PUBMED_FETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+EUTILS_URL = os.getenv("MEDCOPILOT_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+PUBMED_SEARCH_URL = f"{EUTILS_URL}/esearch.fcgi"
+PUBMED_FETCH_URL = f"{EUTILS_URL}/efetch.fcgi"
+PAGE_SIZE = 500
 
+# NCBI asks clients to identify themselves and to stay within 3 requests/second
+NCBI_TOOL = os.getenv("NCBI_TOOL", "medcopilot")
+NCBI_EMAIL = os.getenv("NCBI_EMAIL")
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+REQUEST_INTERVAL = 1 / 3
 
-def fetch_pubmed(query, max_results=50):
+# E-utilities will not return PubMed records past this position
+MAX_RETRIEVABLE = 10000
+
+_last_request = 0.0
+_request_lock = threading.Lock()
+
+
+def eutils_get(url, params, timeout):
+    global _last_request
+
+    params = dict(params, tool=NCBI_TOOL)
+    if NCBI_EMAIL:
+        params["email"] = NCBI_EMAIL
+    if NCBI_API_KEY:
+        params["api_key"] = NCBI_API_KEY
+
+    with _request_lock:
+        wait = _last_request + REQUEST_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
+
+    response = requests.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+
+def iter_pubmed_pages(query, max_results=50, mindate=None, maxdate=None, datetype="edat"):
+    """Fetch PubMed records for a query page by page, yielding each saved XML path.
+
+    mindate/maxdate use the E-utilities YYYY/MM/DD format. Results are paged
+    through the Entrez history server, PAGE_SIZE records per file, until
+    max_results (or every retrievable match, if None) is reached. Pages saved
+    before an error have already been yielded.
+    """
     print(f"🔍 Searching PubMed for: {query}")
 
     params = {
         "db": "pubmed",
         "term": query,
-        "retmax": max_results,
+        "retmax": 0,
+        "usehistory": "y",
         "retmode": "xml"
     }
 
-    search = requests.get(PUBMED_SEARCH_URL, params=params)
+    if mindate:
+        params.update({
+            "datetype": datetype,
+            "mindate": mindate,
+            "maxdate": maxdate or datetime.now().strftime("%Y/%m/%d")
+        })
+
+    search = eutils_get(PUBMED_SEARCH_URL, params, timeout=60)
     root = ET.fromstring(search.text)
 
-    ids = [id.text for id in root.findall(".//Id")]
-    print(f"📄 Found {len(ids)} papers")
+    count = int(root.findtext("Count", default="0"))
+    limit = MAX_RETRIEVABLE if max_results is None else min(max_results, MAX_RETRIEVABLE)
+    total = min(count, limit)
+    print(f"📄 Found {count} papers")
 
-    if not ids:
-        return
+    if count > total == MAX_RETRIEVABLE:
+        print(f"⚠️ Only the first {MAX_RETRIEVABLE} can be fetched; narrow the query or date window.")
 
-    fetch_params = {
-        "db": "pubmed",
-        "id": ",".join(ids),
-        "retmode": "xml"
-    }
+    # Delta fetches get a timestamp so repeated runs on one day don't overwrite each other
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S" if mindate else "%Y%m%d")
+
+    for page, retstart in enumerate(range(0, total, PAGE_SIZE), start=1):
+        fetch_params = {
+            "db": "pubmed",
+            "WebEnv": root.findtext("WebEnv"),
+            "query_key": root.findtext("QueryKey"),
+            "retstart": retstart,
+            "retmax": min(PAGE_SIZE, total - retstart),
+            "retmode": "xml"
+        }
+
+        fetch = eutils_get(PUBMED_FETCH_URL, fetch_params, timeout=120)
+
+        filename = f"pubmed_{query.replace(' ', '_')}_{stamp}_p{page}.xml"
+        path = os.path.join(SAVE_DIR, filename)
 
-    fetch = requests.get(PUBMED_FETCH_URL, params=fetch_params)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(fetch.text)
 
-    filename = f"pubmed_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.xml"
-    path = os.path.join(SAVE_DIR, filename)
+        print(f"✅ Saved: {path}")
+        yield path
 
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(fetch.text)
 
-    print(f"✅ Saved: {path}")
+def fetch_pubmed(query, max_results=50, mindate=None, maxdate=None, datetype="edat"):
+    """Fetch PubMed records for a query; returns the saved XML paths (empty if none matched)."""
+    return list(iter_pubmed_pages(query, max_results, mindate, maxdate, datetype))
 
 
 if __name__ == "__main__":
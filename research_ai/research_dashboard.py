@@ -4,38 +4,39 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.warning("Please login to access Research AI")
     st.switch_page("../login.py")
 
+import os
+import sys
 import streamlit as st
-import faiss
-import pickle
-import numpy as np
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_server import encode
+from vector_store import (
+    load_snapshot, current_version, search_snapshot, import_legacy, read_legacy_cache,
+    process_memory, format_memory
+)
 
 VECTOR_DIR = "research_ai/vector_db"
-INDEX_FILE = f"{VECTOR_DIR}/pubmed.index"
-CACHE_FILE = f"{VECTOR_DIR}/pubmed.pkl"
+LEGACY_INDEX_FILE = f"{VECTOR_DIR}/pubmed.index"
+LEGACY_CACHE_FILE = f"{VECTOR_DIR}/pubmed.pkl"
 
 st.set_page_config(page_title="MedCopilot Research AI", page_icon="🔬", layout="wide")
 
 st.title("🔬 MedCopilot Research AI — PubMed Intelligence")
 st.caption("Medical Literature • Research Intelligence • Evidence Copilot")
 
-@st.cache_resource
-def load_embedder():
-    return SentenceTransformer("all-MiniLM-L6-v2")
-
-embedder = load_embedder()
-
 
-def load_index():
-    index = faiss.read_index(INDEX_FILE)
-    with open(CACHE_FILE, "rb") as f:
-        data = pickle.load(f)
-    return index, data["documents"], data["sources"]
+@st.cache_resource(max_entries=1)
+def load_index(version):
+    return load_snapshot(VECTOR_DIR, version)
 
 
 try:
-    index, documents, sources = load_index()
+    import_legacy(VECTOR_DIR, LEGACY_INDEX_FILE, lambda: read_legacy_cache(LEGACY_CACHE_FILE, "PMID:"))
+    snapshot = load_index(current_version(VECTOR_DIR))
+    documents, sources = snapshot["documents"], snapshot["sources"]
     st.sidebar.success("🟢 Research Knowledge Base Loaded")
+    st.sidebar.caption(f"Index snapshot: {snapshot['version']}")
+    st.sidebar.caption(format_memory(process_memory()))
 except:
     st.sidebar.error("❌ Research index not found. Run research_indexer.py")
     st.stop()
@@ -44,12 +45,12 @@ except:
 query = st.text_input("Ask a medical research question (PubMed)")
 
 if st.button("🚀 Run Research Intelligence") and query:
-    q_emb = embedder.encode([query])
-    D, I = index.search(np.array(q_emb), 5)
+    q_emb = encode([query])
+    rows = search_snapshot(snapshot, q_emb, 5)
 
     st.subheader("📚 Research Evidence")
 
-    for i in I[0]:
+    for i in rows:
         st.markdown(documents[i][:1200])
         st.info(sources[i])
 
@@ -1,19 +1,22 @@
 import os
-import pickle
-import faiss
+import sys
 import numpy as np
 import xml.etree.ElementTree as ET
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_server import encode
+from vector_store import (
+    save_snapshot, upsert_snapshot, load_tombstones, import_legacy, read_legacy_cache
+)
+from dedup import files_oldest_first, newest_by_key
 
 DATA_DIR = "research_ai/data/pubmed"
 VECTOR_DIR = "research_ai/vector_db"
-INDEX_FILE = os.path.join(VECTOR_DIR, "pubmed.index")
-CACHE_FILE = os.path.join(VECTOR_DIR, "pubmed.pkl")
+LEGACY_INDEX_FILE = os.path.join(VECTOR_DIR, "pubmed.index")
+LEGACY_CACHE_FILE = os.path.join(VECTOR_DIR, "pubmed.pkl")
 
 os.makedirs(VECTOR_DIR, exist_ok=True)
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
 
 def parse_pubmed_xml(file_path):
     tree = ET.parse(file_path)
@@ -35,35 +38,63 @@ def parse_pubmed_xml(file_path):
     return docs, sources
 
 
+def read_records(paths):
+    tombstones = load_tombstones(VECTOR_DIR)
+    for path in paths:
+        d, s = parse_pubmed_xml(path)
+        for doc, source in zip(d, s):
+            pmid = source.replace("PMID:", "").strip()
+            if pmid not in tombstones:
+                yield pmid, doc, source
+
+
 def build_index():
-    documents = []
-    sources = []
+    import faiss
 
-    for file in os.listdir(DATA_DIR):
-        if file.endswith(".xml"):
-            d, s = parse_pubmed_xml(os.path.join(DATA_DIR, file))
-            documents.extend(d)
-            sources.extend(s)
+    documents, sources, keys, duplicates = newest_by_key(
+        read_records(files_oldest_first(DATA_DIR, ".xml"))
+    )
 
     if not documents:
         print("❌ No research papers found.")
         return
 
+    if duplicates:
+        print(f"🧹 Skipped {duplicates} duplicate PMIDs (kept newest).")
+
     print(f"🧠 Indexing {len(documents)} research papers...")
 
-    embeddings = model.encode(documents, batch_size=16)
+    embeddings = encode(documents)
     dim = embeddings.shape[1]
 
     index = faiss.IndexFlatL2(dim)
     index.add(np.array(embeddings))
 
-    faiss.write_index(index, INDEX_FILE)
-
-    with open(CACHE_FILE, "wb") as f:
-        pickle.dump({"documents": documents, "sources": sources}, f)
+    version = save_snapshot(VECTOR_DIR, index, documents, sources, keys,
+                            note=f"build of {len(documents)} research papers")
+    print(f"📦 Snapshot {version} is now live.")
 
     print("✅ Research knowledge index built successfully.")
 
 
+def update_index(paths):
+    """Add or replace the research papers in the given files without re-encoding the rest."""
+    documents, sources, keys, _ = newest_by_key(read_records(paths))
+
+    if not documents:
+        print("No new research papers to index.")
+        return None
+
+    print(f"🧠 Indexing {len(documents)} new or updated research papers...")
+
+    embeddings = encode(documents)
+    # Carry over a pre-snapshot index so the upsert does not start from empty
+    import_legacy(VECTOR_DIR, LEGACY_INDEX_FILE, lambda: read_legacy_cache(LEGACY_CACHE_FILE, "PMID:"))
+    version = upsert_snapshot(VECTOR_DIR, embeddings, documents, sources, keys,
+                              note=f"sync of {len(documents)} research papers")
+    print(f"📦 Snapshot {version} is now live.")
+    return version
+
+
 if __name__ == "__main__":
     build_index()
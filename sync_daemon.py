@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from research_ai import pubmed_ingest, research_indexer
+from trials_data import trials_ingest, trials_indexer
+
+# Scheduled delta sync for tracked PubMed topics and trial conditions.
+#
+#   python sync_daemon.py          run every SYNC_INTERVAL_HOURS (default 24)
+#   python sync_daemon.py --once   single pass, e.g. from cron
+#
+# A high-water mark per topic is kept in STATE_FILE: the last Entrez date
+# synced for PubMed and the last-update date for trials. Each run only asks
+# for records on/after that date, paging until every match is fetched, and
+# feeds them to incremental indexing. Topics without a mark start
+# SYNC_LOOKBACK_DAYS back instead of fetching their whole history; set
+# NCBI_EMAIL / NCBI_API_KEY to identify the PubMed client to NCBI.
+# Point MEDCOPILOT_EUTILS_URL / MEDCOPILOT_CTGOV_URL at local stub servers
+# to run it offline.
+
+CONFIG_FILE = os.getenv("MEDCOPILOT_SYNC_CONFIG", "sync_topics.json")
+STATE_FILE = os.getenv("MEDCOPILOT_SYNC_STATE", "research_ai/sync_state.json")
+SYNC_INTERVAL_HOURS = float(os.getenv("SYNC_INTERVAL_HOURS", "24"))
+SYNC_LOOKBACK_DAYS = int(os.getenv("SYNC_LOOKBACK_DAYS", "30"))
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state):
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def sync_store(store, topics, state, fetch, update, today):
+    """Fetch every topic, then index all new files with one snapshot for the store.
+
+    fetch(topic, since) yields saved file paths; since is None for a new topic.
+    A topic's mark only moves once all its pages are indexed; topics whose
+    fetch failed keep their old mark and are retried next run, but the pages
+    they saved before failing are still indexed.
+    """
+    paths = []
+    fetched = []
+
+    for topic in topics:
+        try:
+            for path in fetch(topic, state[store].get(topic)):
+                paths.append(path)
+        except Exception as e:
+            print(f"❌ Sync failed for '{topic}': {e}")
+            continue
+        fetched.append(topic)
+
+    if paths:
+        update(paths)
+
+    for topic in fetched:
+        state[store][topic] = today
+
+
+def sync_pubmed(topics, state):
+    # Entrez date ranges are inclusive, so the boundary day is fetched again;
+    # the indexer replaces those PMIDs instead of duplicating them.
+    today = date.today().strftime("%Y/%m/%d")
+    first_run = (date.today() - timedelta(days=SYNC_LOOKBACK_DAYS)).strftime("%Y/%m/%d")
+
+    def fetch(topic, since):
+        return pubmed_ingest.iter_pubmed_pages(
+            topic,
+            max_results=None,
+            mindate=since or first_run,
+            maxdate=today,
+            datetype="edat"
+        )
+
+    sync_store("pubmed", topics, state, fetch, research_indexer.update_index, today)
+
+
+def sync_trials(conditions, state):
+    today = date.today()
+
+    first_run = today - timedelta(days=SYNC_LOOKBACK_DAYS)
+
+    def fetch(condition, since):
+        return trials_ingest.iter_trials_pages(
+            condition,
+            max_results=None,
+            updated_since=date.fromisoformat(since) if since else first_run
+        )
+
+    sync_store("trials", conditions, state, fetch, trials_indexer.update_trials_index,
+               today.isoformat())
+
+
+def run_once():
+    config = load_json(CONFIG_FILE, None)
+    if config is None:
+        print(f"❌ No sync config found at {CONFIG_FILE}")
+        return
+
+    state = load_json(STATE_FILE, {})
+    state.setdefault("pubmed", {})
+    state.setdefault("trials", {})
+
+    print(f"🔄 Sync started {datetime.now().isoformat(timespec='seconds')}")
+
+    jobs = [
+        (sync_pubmed, "pubmed", config.get("pubmed", [])),
+        (sync_trials, "trials", config.get("trials", []))
+    ]
+
+    for job, store, topics in jobs:
+        try:
+            job(topics, state)
+        except Exception as e:
+            # Leave the high-water marks untouched so the next run retries
+            print(f"❌ Sync failed for {store}: {e}")
+            continue
+        save_state(state)
+
+    print("✅ Sync finished.")
+
+
+def run_forever(interval_hours=SYNC_INTERVAL_HOURS):
+    while True:
+        run_once()
+        time.sleep(interval_hours * 3600)
+
+
+if __name__ == "__main__":
+    if "--once" in sys.argv:
+        run_once()
+    else:
+        run_forever()
@@ -0,0 +1,82 @@
+import os
+
+from dedup import NearDuplicateFilter, fetch_stamp, files_oldest_first, newest_by_key
+
+
+GUIDELINE = (
+    "Sepsis bundle: measure lactate, obtain blood cultures before antibiotics, "
+    "administer broad-spectrum antibiotics and 30 mL/kg crystalloid for "
+    "hypotension or lactate of 4 mmol/L or more, and apply vasopressors if "
+    "hypotension persists during or after fluid resuscitation to maintain a "
+    "mean arterial pressure of 65 mmHg or higher. Reassess volume status and "
+    "tissue perfusion after initial fluid resuscitation."
+)
+
+
+def test_fetch_stamp_reads_every_file_name_format():
+    assert fetch_stamp("pubmed_sepsis_20240105.xml") == "20240105000000"
+    assert fetch_stamp("pubmed_sepsis_20240105_093015.xml") == "20240105093015"
+    assert fetch_stamp("pubmed_sepsis_20240105_093015_p3.xml") == "20240105093015"
+    assert fetch_stamp("trials_heart_failure_20240105_p2.json") == "20240105000000"
+    assert fetch_stamp("notes.json") == ""
+
+
+def test_files_oldest_first_orders_by_fetch_date_not_mtime(tmp_path):
+    names = [
+        "trials_x_20240301.json",
+        "trials_x_20240101_120000_p1.json",
+        "trials_x_20240201_080000.json",
+    ]
+    for age, name in enumerate(names):
+        path = tmp_path / name
+        path.write_text("{}")
+        # Newest mtime on the oldest fetch, as after a copy or restore
+        os.utime(path, (1_000_000 - age, 1_000_000 - age))
+
+    ordered = [os.path.basename(p) for p in files_oldest_first(str(tmp_path), ".json")]
+    assert ordered == [
+        "trials_x_20240101_120000_p1.json",
+        "trials_x_20240201_080000.json",
+        "trials_x_20240301.json",
+    ]
+
+
+def test_newest_by_key_keeps_record_from_latest_file(tmp_path):
+    old = tmp_path / "pubmed_t_20240101.xml"
+    new = tmp_path / "pubmed_t_20240102_101500_p1.xml"
+    for path in (new, old):
+        path.write_text("")
+
+    records_by_file = {
+        str(old): [("1", "old abstract", "PMID: 1"), ("2", "only copy", "PMID: 2")],
+        str(new): [("1", "corrected abstract", "PMID: 1")],
+    }
+    records = (
+        record
+        for path in files_oldest_first(str(tmp_path), ".xml")
+        for record in records_by_file[path]
+    )
+
+    documents, sources, keys, dropped = newest_by_key(
+        list(records) + [("", "no key", "unknown")]
+    )
+
+    assert dict(zip(keys, documents)) == {"1": "corrected abstract", "2": "only copy", "": "no key"}
+    assert dropped == 1
+
+
+def test_near_duplicate_filter_drops_exact_and_near_copies():
+    near_dups = NearDuplicateFilter()
+    # Same page re-exported with a different footer
+    near_copy = GUIDELINE + " Revised 2024"
+    distinct = (
+        "Heart failure with reduced ejection fraction: start an ACE inhibitor or "
+        "ARNI, a beta blocker, a mineralocorticoid antagonist and an SGLT2 "
+        "inhibitor, titrating each to the target dose as tolerated."
+    )
+
+    assert not near_dups.is_duplicate(GUIDELINE)
+    assert near_dups.is_duplicate(GUIDELINE)
+    assert near_dups.is_duplicate(near_copy)
+    assert not near_dups.is_duplicate(distinct)
+    assert not near_dups.is_duplicate("")
@@ -0,0 +1,172 @@
+import json
+import threading
+import socketserver
+import time
+
+import numpy as np
+import pytest
+
+import embedding_server
+from embedding_server import EmbeddingServer, MicroBatcher
+
+
+class RecordingEncoder:
+    """Returns row i as [len(text)] and records the texts of every encode() call."""
+
+    name = "recording"
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def encode(self, texts, batch_size=16):
+        self.calls.append(list(texts))
+        if self.error:
+            raise self.error
+        return np.array([[float(len(t))] for t in texts], dtype="float32")
+
+
+def submit_concurrently(batcher, requests):
+    results = [None] * len(requests)
+
+    def submit(i):
+        try:
+            results[i] = batcher.submit(requests[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+# ===================== MICRO-BATCHER =====================
+
+def test_concurrent_submits_share_one_encode_call():
+    model = RecordingEncoder()
+    batcher = MicroBatcher(model, window_ms=300, max_batch=64)
+
+    results = submit_concurrently(batcher, [["a"], ["bb", "ccc"], ["dddd"]])
+
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0]) == ["a", "bb", "ccc", "dddd"]
+    # Each caller still gets back exactly its own rows
+    assert [r[:, 0].tolist() for r in results] == [[1.0], [2.0, 3.0], [4.0]]
+
+
+def test_large_submit_is_split_into_max_batch_chunks():
+    model = RecordingEncoder()
+    batcher = MicroBatcher(model, window_ms=1, max_batch=4)
+
+    texts = ["x" * n for n in range(1, 11)]
+    result = batcher.submit(texts)
+
+    assert [len(call) for call in model.calls] == [4, 4, 2]
+    assert result[:, 0].tolist() == [float(n) for n in range(1, 11)]
+
+
+def test_encoder_error_reaches_every_waiting_job():
+    model = RecordingEncoder(error=RuntimeError("model crashed"))
+    batcher = MicroBatcher(model, window_ms=300, max_batch=64)
+
+    results = submit_concurrently(batcher, [["a"], ["b"], ["c"]])
+
+    assert len(model.calls) == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "model crashed" for r in results)
+
+
+# ===================== CLIENT =====================
+
+class SlowOnceEncoder(RecordingEncoder):
+    """Stalls on the first call containing `slow_text`, longer than the client read timeout."""
+
+    def __init__(self, slow_text, delay):
+        super().__init__()
+        self.slow_text = slow_text
+        self.stall = delay
+
+    def encode(self, texts, batch_size=16):
+        if self.slow_text in texts and self.stall:
+            stall, self.stall = self.stall, 0
+            time.sleep(stall)
+        return super().encode(texts, batch_size)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    def start(model):
+        srv = EmbeddingServer(MicroBatcher(model, window_ms=1, max_batch=64), "127.0.0.1", 0)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        monkeypatch.setattr(embedding_server, "PORT", srv.server_address[1])
+        return srv
+
+    servers = []
+    monkeypatch.setattr(embedding_server, "_server_down_until", 0.0)
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_timed_out_chunk_is_retried_alone(server, monkeypatch):
+    model = SlowOnceEncoder("c", delay=0.6)
+    server(model)
+    monkeypatch.setattr(embedding_server, "MAX_BATCH_SIZE", 2)
+    monkeypatch.setattr(embedding_server, "READ_TIMEOUT", 0.3)
+
+    def no_local_model(texts):
+        raise AssertionError("fell back to a local model")
+
+    monkeypatch.setattr(embedding_server, "_encode_local", no_local_model)
+
+    result = embedding_server.encode(["a", "bb", "c", "dd", "eee"])
+
+    assert result[:, 0].tolist() == [1.0, 2.0, 1.0, 2.0, 3.0]
+    # The first chunk went to the server once; only the slow one was re-sent
+    assert model.calls == [["a", "bb"], ["c", "dd"], ["c", "dd"], ["eee"]]
+
+
+class OneReplyHandler(socketserver.StreamRequestHandler):
+    """Answers the first request it ever sees, then hangs up on everything."""
+
+    answered = []
+
+    def handle(self):
+        if self.answered:
+            return
+        texts = json.loads(self.rfile.readline())["texts"]
+        self.answered.append(texts)
+        reply = embedding_server.pack_embeddings([[float(len(t))] for t in texts])
+        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+def test_falls_back_locally_for_the_remaining_chunks_only(monkeypatch):
+    OneReplyHandler.answered = []
+    srv = socketserver.ThreadingTCPServer(("127.0.0.1", 0), OneReplyHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    local_calls = []
+
+    def local_model(texts):
+        local_calls.append(list(texts))
+        return np.array([[-1.0] for _ in texts], dtype="float32")
+
+    monkeypatch.setattr(embedding_server, "PORT", srv.server_address[1])
+    monkeypatch.setattr(embedding_server, "_server_down_until", 0.0)
+    monkeypatch.setattr(embedding_server, "MAX_BATCH_SIZE", 2)
+    monkeypatch.setattr(embedding_server, "RETRY_DELAYS", (0.01,))
+    monkeypatch.setattr(embedding_server, "_encode_local", local_model)
+
+    try:
+        result = embedding_server.encode(["a", "bb", "c", "dd", "eee"])
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+    assert OneReplyHandler.answered == [["a", "bb"]]
+    assert result[:, 0].tolist() == [1.0, 2.0, -1.0, -1.0, -1.0]
+    assert local_calls == [["c", "dd", "eee"]]
@@ -0,0 +1,32 @@
+import os
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+pytest.importorskip("sentence_transformers")
+
+import encoders
+
+
+@pytest.fixture(scope="module")
+def onnx_model(tmp_path_factory):
+    if os.path.exists(encoders.ONNX_INT8_PATH):
+        return encoders.ONNX_INT8_PATH
+
+    out_dir = tmp_path_factory.mktemp("onnx")
+    try:
+        return encoders.export_onnx(
+            fp32_path=str(out_dir / "model.onnx"),
+            int8_path=str(out_dir / "model.int8.onnx")
+        )
+    except OSError as e:
+        pytest.skip(f"MiniLM weights unavailable: {e}")
+
+
+def test_onnx_int8_matches_torch_embeddings(onnx_model):
+    assert encoders.check_parity(min_cosine=0.99, model_path=onnx_model) >= 0.99
+
+
+def test_onnx_encoder_requires_exported_model(tmp_path):
+    with pytest.raises(FileNotFoundError, match="python encoders.py"):
+        encoders.OnnxEncoder(str(tmp_path / "missing.onnx"))
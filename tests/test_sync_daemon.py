@@ -0,0 +1,254 @@
+import json
+import time
+import threading
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("requests")
+
+import embedding_server
+import sync_daemon
+import vector_store
+from research_ai import pubmed_ingest, research_indexer
+from trials_data import trials_ingest, trials_indexer
+
+
+# ===================== STUB APIS =====================
+
+class StubApis(BaseHTTPRequestHandler):
+    """E-utilities (esearch/efetch) and ClinicalTrials.gov v2 studies, served from memory."""
+
+    papers = {}
+    trials = {}
+    requests = []
+    failing = set()
+    efetch_fails_from = None
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        type(self).requests.append((url.path, params))
+
+        if url.path in self.failing:
+            self.send_error(500)
+            return
+
+        if url.path.endswith("/esearch.fcgi"):
+            self._reply(
+                f"<eSearchResult><Count>{len(self.papers)}</Count>"
+                f"<QueryKey>1</QueryKey><WebEnv>stub</WebEnv></eSearchResult>",
+                "text/xml"
+            )
+        elif url.path.endswith("/efetch.fcgi"):
+            start = int(params["retstart"])
+            if self.efetch_fails_from is not None and start >= self.efetch_fails_from:
+                self.send_error(500)
+                return
+            pmids = sorted(self.papers)[start:start + int(params["retmax"])]
+            articles = "".join(
+                f"<PubmedArticle><PMID>{pmid}</PMID><ArticleTitle>Paper {pmid}</ArticleTitle>"
+                f"<AbstractText>{self.papers[pmid]}</AbstractText></PubmedArticle>"
+                for pmid in pmids
+            )
+            self._reply(f"<PubmedArticleSet>{articles}</PubmedArticleSet>", "text/xml")
+        elif url.path.endswith("/studies"):
+            start = int(params.get("pageToken", 0))
+            end = start + int(params["pageSize"])
+            ncts = sorted(self.trials)[start:end]
+            body = {
+                "studies": [
+                    {"protocolSection": {
+                        "identificationModule": {
+                            "nctId": nct,
+                            "briefTitle": f"Randomized controlled study of intervention {nct}"
+                        },
+                        "conditionsModule": {"conditions": ["Heart Failure"]},
+                        "designModule": {"phases": ["PHASE3"]},
+                        "statusModule": {"overallStatus": self.trials[nct]}
+                    }}
+                    for nct in ncts
+                ],
+                "totalCount": len(self.trials)
+            }
+            if end < len(self.trials):
+                body["nextPageToken"] = str(end)
+            self._reply(json.dumps(body), "application/json")
+        else:
+            self.send_error(404)
+
+
+class HashEncoder:
+    """Deterministic stand-in for MiniLM: one vector per distinct text."""
+
+    name = "hash"
+
+    def encode(self, texts, batch_size=16):
+        return np.stack([
+            np.random.RandomState(zlib.crc32(t.encode("utf-8"))).rand(8).astype("float32")
+            for t in texts
+        ])
+
+
+@pytest.fixture
+def sync_env(tmp_path, monkeypatch):
+    StubApis.papers = {
+        str(pmid): "Metformin lowers glucose in type 2 diabetes. " * 6
+        for pmid in range(1001, 1006)
+    }
+    StubApis.trials = {f"NCT0000000{i}": "RECRUITING" for i in range(1, 4)}
+    StubApis.requests = []
+    StubApis.failing = set()
+    StubApis.efetch_fails_from = None
+
+    api = ThreadingHTTPServer(("127.0.0.1", 0), StubApis)
+    batcher = embedding_server.MicroBatcher(HashEncoder())
+    embedder = embedding_server.EmbeddingServer(batcher, "127.0.0.1", 0)
+    for server in (api, embedder):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base = f"http://127.0.0.1:{api.server_address[1]}"
+    monkeypatch.setattr(embedding_server, "PORT", embedder.server_address[1])
+    monkeypatch.setattr(embedding_server, "_server_down_until", 0.0)
+    monkeypatch.setattr(pubmed_ingest, "PUBMED_SEARCH_URL", f"{base}/entrez/eutils/esearch.fcgi")
+    monkeypatch.setattr(pubmed_ingest, "PUBMED_FETCH_URL", f"{base}/entrez/eutils/efetch.fcgi")
+    monkeypatch.setattr(pubmed_ingest, "PAGE_SIZE", 2)
+    monkeypatch.setattr(pubmed_ingest, "REQUEST_INTERVAL", 0)
+    monkeypatch.setattr(trials_ingest, "BASE_URL", f"{base}/api/v2/studies")
+    monkeypatch.setattr(trials_ingest, "PAGE_SIZE", 2)
+
+    monkeypatch.chdir(tmp_path)
+    for d in (pubmed_ingest.SAVE_DIR, trials_ingest.SAVE_DIR,
+              research_indexer.VECTOR_DIR, trials_indexer.VECTOR_DIR):
+        (tmp_path / d).mkdir(parents=True, exist_ok=True)
+
+    (tmp_path / "sync_topics.json").write_text(
+        json.dumps({"pubmed": ["type 2 diabetes"], "trials": ["heart failure"]})
+    )
+    monkeypatch.setattr(sync_daemon, "CONFIG_FILE", "sync_topics.json")
+    monkeypatch.setattr(sync_daemon, "STATE_FILE", "sync_state.json")
+
+    yield StubApis
+
+    api.shutdown()
+    embedder.shutdown()
+    api.server_close()
+    embedder.server_close()
+
+
+def requests_to(path_suffix):
+    return [params for path, params in StubApis.requests if path.endswith(path_suffix)]
+
+
+def read_state():
+    with open(sync_daemon.STATE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ===================== TESTS =====================
+
+def test_sync_pages_through_every_result_and_moves_marks(sync_env):
+    sync_daemon.run_once()
+
+    papers = vector_store.load_snapshot(research_indexer.VECTOR_DIR)
+    trials = vector_store.load_snapshot(trials_indexer.VECTOR_DIR)
+    assert sorted(papers["keys"]) == sorted(sync_env.papers)
+    assert sorted(trials["keys"]) == sorted(sync_env.trials)
+
+    assert [p["retstart"] for p in requests_to("efetch.fcgi")] == ["0", "2", "4"]
+    assert len(requests_to("/studies")) == 2
+
+    state = read_state()
+    assert state["pubmed"]["type 2 diabetes"] == date.today().strftime("%Y/%m/%d")
+    assert state["trials"]["heart failure"] == date.today().isoformat()
+
+
+def test_first_run_starts_at_lookback_window(sync_env):
+    sync_daemon.run_once()
+
+    start = date.today() - timedelta(days=sync_daemon.SYNC_LOOKBACK_DAYS)
+    search = requests_to("esearch.fcgi")[0]
+    assert search["mindate"] == start.strftime("%Y/%m/%d")
+    assert search["tool"] == pubmed_ingest.NCBI_TOOL
+    assert f"RANGE[{start.isoformat()},MAX]" in requests_to("/studies")[0]["query.term"]
+
+
+def test_next_run_refetches_boundary_day_and_replaces_records(sync_env):
+    sync_daemon.run_once()
+    sync_env.trials["NCT00000002"] = "COMPLETED"
+    StubApis.requests = []
+
+    sync_daemon.run_once()
+
+    # Ranges are inclusive of the previous mark, so the boundary day is fetched again
+    assert requests_to("esearch.fcgi")[0]["mindate"] == date.today().strftime("%Y/%m/%d")
+    assert f"RANGE[{date.today().isoformat()},MAX]" in requests_to("/studies")[0]["query.term"]
+
+    papers = vector_store.load_snapshot(research_indexer.VECTOR_DIR)
+    trials = vector_store.load_snapshot(trials_indexer.VECTOR_DIR)
+    assert sorted(papers["keys"]) == sorted(sync_env.papers)
+    assert sorted(trials["keys"]) == sorted(sync_env.trials)
+    assert papers["index"].ntotal == len(sync_env.papers)
+
+    updated = trials["documents"][trials["keys"].index("NCT00000002")]
+    assert "Status: COMPLETED" in updated
+
+
+def test_one_snapshot_per_store_per_run(sync_env):
+    with open("sync_topics.json", "w", encoding="utf-8") as f:
+        json.dump({"pubmed": ["type 2 diabetes", "sepsis"], "trials": ["heart failure", "stroke"]}, f)
+
+    sync_daemon.run_once()
+
+    assert vector_store.list_snapshots(research_indexer.VECTOR_DIR) == ["v0001"]
+    assert vector_store.list_snapshots(trials_indexer.VECTOR_DIR) == ["v0001"]
+
+
+def test_failed_fetch_leaves_mark_unchanged(sync_env):
+    with open(sync_daemon.STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"pubmed": {"type 2 diabetes": "2020/01/01"}, "trials": {}}, f)
+    sync_env.failing.add("/entrez/eutils/efetch.fcgi")
+
+    sync_daemon.run_once()
+
+    state = read_state()
+    assert state["pubmed"]["type 2 diabetes"] == "2020/01/01"
+    assert state["trials"]["heart failure"] == date.today().isoformat()
+    assert vector_store.current_version(research_indexer.VECTOR_DIR) is None
+
+
+def test_pages_saved_before_a_failure_are_indexed(sync_env):
+    sync_env.efetch_fails_from = 2
+
+    sync_daemon.run_once()
+
+    papers = vector_store.load_snapshot(research_indexer.VECTOR_DIR)
+    assert sorted(papers["keys"]) == sorted(sync_env.papers)[:2]
+    assert "type 2 diabetes" not in read_state()["pubmed"]
+
+
+def test_eutils_requests_are_rate_limited(sync_env, monkeypatch):
+    monkeypatch.setattr(pubmed_ingest, "REQUEST_INTERVAL", 0.2)
+    monkeypatch.setattr(pubmed_ingest, "_last_request", 0.0)
+
+    start = time.monotonic()
+    pubmed_ingest.fetch_pubmed("type 2 diabetes", max_results=None)
+
+    # esearch + 3 efetch pages: three waits between four requests
+    assert time.monotonic() - start >= 0.6
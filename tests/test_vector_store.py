@@ -0,0 +1,202 @@
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+import vector_store
+
+
+def flat_index(vectors):
+    index = faiss.IndexFlatL2(4)
+    index.add(np.asarray(vectors, dtype="float32"))
+    return index
+
+
+def line_vectors(n):
+    # Row i sits at distance i from the origin, so search order is row order
+    return [[float(i), 0.0, 0.0, 0.0] for i in range(n)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store_dir = str(tmp_path / "store")
+    keys = [f"k{i}" for i in range(6)]
+    vector_store.save_snapshot(
+        store_dir, flat_index(line_vectors(6)),
+        [f"doc {k}" for k in keys], [f"src {k}" for k in keys], keys
+    )
+    return store_dir
+
+
+ORIGIN = np.zeros((1, 4), dtype="float32")
+
+
+# ===================== SEARCH =====================
+
+def test_search_skips_tombstoned_rows_and_still_returns_k(store):
+    vector_store.add_tombstones(store, ["k0", "k1", "k2"])
+    snapshot = vector_store.load_snapshot(store)
+
+    # The three nearest rows are deleted; over-fetching by the deleted count
+    # still fills k from the live ones
+    assert vector_store.search_snapshot(snapshot, ORIGIN, 3) == [3, 4, 5]
+
+
+def test_search_sees_new_tombstones_without_reloading(store):
+    snapshot = vector_store.load_snapshot(store)
+    assert vector_store.search_snapshot(snapshot, ORIGIN, 2) == [0, 1]
+
+    vector_store.add_tombstones(store, ["k0"])
+    assert vector_store.search_snapshot(snapshot, ORIGIN, 2) == [1, 2]
+
+    vector_store.remove_tombstones(store, ["k0"])
+    assert vector_store.search_snapshot(snapshot, ORIGIN, 2) == [0, 1]
+
+
+# ===================== COMPACTION / ROLLBACK / PRUNE =====================
+
+def test_compact_drops_tombstoned_rows_and_keeps_vectors(store):
+    vector_store.add_tombstones(store, ["k1", "k4"])
+
+    assert vector_store.compact(store) == "v0002"
+
+    snapshot = vector_store.load_snapshot(store)
+    assert snapshot["keys"] == ["k0", "k2", "k3", "k5"]
+    assert snapshot["documents"] == ["doc k0", "doc k2", "doc k3", "doc k5"]
+    vectors = snapshot["index"].reconstruct_n(0, snapshot["index"].ntotal)
+    assert vectors[:, 0].tolist() == [0.0, 2.0, 3.0, 5.0]
+
+
+def test_compact_waits_for_threshold_unless_forced(store):
+    vector_store.add_tombstones(store, ["k0"])
+
+    assert vector_store.compact(store, threshold=0.5) is None
+    assert vector_store.compact(store, threshold=0.5, force=True) == "v0002"
+
+
+def test_rollback_switches_current_snapshot(store):
+    vector_store.save_snapshot(store, flat_index(line_vectors(1)), ["new"], ["new"], ["new"])
+    assert vector_store.current_version(store) == "v0002"
+
+    vector_store.rollback(store, "v0001")
+    assert vector_store.load_snapshot(store)["keys"][0] == "k0"
+
+    with pytest.raises(ValueError):
+        vector_store.rollback(store, "v0042")
+
+
+def test_prune_keeps_newest_snapshots_and_current(store):
+    for _ in range(3):
+        vector_store.save_snapshot(store, flat_index(line_vectors(1)), ["d"], ["s"], ["k"])
+    vector_store.rollback(store, "v0001")
+    os.makedirs(os.path.join(store, vector_store.SNAPSHOT_DIR, ".v0009-crash.tmp"))
+
+    removed = vector_store.prune_snapshots(store, keep=2)
+
+    assert removed == ["v0002"]
+    assert vector_store.list_snapshots(store) == ["v0001", "v0003", "v0004"]
+    assert sorted(os.listdir(os.path.join(store, vector_store.SNAPSHOT_DIR))) == [
+        "v0001", "v0003", "v0004"
+    ]
+
+
+def test_save_applies_retention(store):
+    for _ in range(vector_store.SNAPSHOT_RETENTION + 2):
+        vector_store.save_snapshot(store, flat_index(line_vectors(1)), ["d"], ["s"], ["k"])
+
+    versions = vector_store.list_snapshots(store)
+    assert len(versions) == vector_store.SNAPSHOT_RETENTION
+    assert versions[-1] == vector_store.current_version(store)
+
+
+# ===================== LEGACY IMPORT =====================
+
+def write_legacy(tmp_path, n_vectors, sources):
+    index_path = str(tmp_path / "pubmed.index")
+    cache_path = str(tmp_path / "pubmed.pkl")
+    faiss.write_index(flat_index(line_vectors(n_vectors)), index_path)
+    with open(cache_path, "wb") as f:
+        pickle.dump({"documents": [f"doc {s}" for s in sources], "sources": sources}, f)
+    return index_path, cache_path
+
+
+def test_import_legacy_creates_first_snapshot_once(tmp_path):
+    store_dir = str(tmp_path / "store")
+    index_path, cache_path = write_legacy(tmp_path, 2, ["PMID: 11", "PMID: 22"])
+    load = lambda: vector_store.read_legacy_cache(cache_path, "PMID:")
+
+    assert vector_store.import_legacy(store_dir, index_path, load) == "v0001"
+    assert vector_store.import_legacy(store_dir, index_path, load) is None
+
+    snapshot = vector_store.load_snapshot(store_dir)
+    assert snapshot["keys"] == ["11", "22"]
+    assert snapshot["sources"] == ["PMID: 11", "PMID: 22"]
+    assert snapshot["index"].ntotal == 2
+
+
+def test_import_legacy_records_count_mismatch(tmp_path):
+    store_dir = str(tmp_path / "store")
+    index_path, cache_path = write_legacy(tmp_path, 3, ["PMID: 11", "PMID: 22"])
+    calls = []
+
+    def load():
+        calls.append(1)
+        return vector_store.read_legacy_cache(cache_path, "PMID:")
+
+    assert vector_store.import_legacy(store_dir, index_path, load) is None
+    assert vector_store.import_legacy(store_dir, index_path, load) is None
+    assert len(calls) == 1
+    assert vector_store.current_version(store_dir) is None
+
+    # A replaced legacy file is tried again
+    write_legacy(tmp_path, 2, ["PMID: 11", "PMID: 22"])
+    stat = os.stat(index_path)
+    os.utime(index_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert vector_store.import_legacy(store_dir, index_path, load) == "v0001"
+
+
+# ===================== WRITER LOCK =====================
+
+def test_store_lock_blocks_other_writers(store):
+    done = []
+
+    def writer():
+        vector_store.save_snapshot(store, flat_index(line_vectors(1)), ["d"], ["s"], ["k"])
+        done.append(vector_store.current_version(store))
+
+    with vector_store.store_lock(store):
+        # Re-entrant within the holding thread
+        with vector_store.store_lock(store):
+            pass
+        thread = threading.Thread(target=writer)
+        thread.start()
+        time.sleep(0.2)
+        assert not done
+        assert vector_store.current_version(store) == "v0001"
+
+    thread.join(timeout=10)
+    assert done == ["v0002"]
+
+
+def test_concurrent_upserts_keep_every_row(store):
+    def writer(worker):
+        for i in range(5):
+            key = f"w{worker}-{i}"
+            vector_store.upsert_snapshot(
+                store, np.ones((1, 4), dtype="float32"), [key], [key], [key]
+            )
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    snapshot = vector_store.load_snapshot(store)
+    assert snapshot["version"] == "v0021"
+    assert len(snapshot["keys"]) == len(set(snapshot["keys"])) == 6 + 20
@@ -1,35 +1,36 @@
+import os
+import sys
 import streamlit as st
-import faiss
-import pickle
-import numpy as np
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_server import encode
+from vector_store import (
+    load_snapshot, current_version, search_snapshot, import_legacy, read_legacy_cache,
+    process_memory, format_memory
+)
 
 VECTOR_DIR = "research_ai/vector_trials"
-INDEX_FILE = f"{VECTOR_DIR}/trials.index"
-CACHE_FILE = f"{VECTOR_DIR}/trials.pkl"
+LEGACY_INDEX_FILE = f"{VECTOR_DIR}/trials.index"
+LEGACY_CACHE_FILE = f"{VECTOR_DIR}/trials.pkl"
 
 st.set_page_config(page_title="MedCopilot Clinical Trials AI", page_icon="🧪", layout="wide")
 
 st.title("🧪 MedCopilot Clinical Trials Intelligence")
 st.caption("Clinical Trials • Research Evidence • Drug Development")
 
-@st.cache_resource
-def load_embedder():
-    return SentenceTransformer("all-MiniLM-L6-v2")
-
-embedder = load_embedder()
-
 
-def load_index():
-    index = faiss.read_index(INDEX_FILE)
-    with open(CACHE_FILE, "rb") as f:
-        data = pickle.load(f)
-    return index, data["documents"], data["sources"]
+@st.cache_resource(max_entries=1)
+def load_index(version):
+    return load_snapshot(VECTOR_DIR, version)
 
 
 try:
-    index, documents, sources = load_index()
+    import_legacy(VECTOR_DIR, LEGACY_INDEX_FILE, lambda: read_legacy_cache(LEGACY_CACHE_FILE, "NCT ID:"))
+    snapshot = load_index(current_version(VECTOR_DIR))
+    documents, sources = snapshot["documents"], snapshot["sources"]
     st.sidebar.success("🟢 Clinical Trials Knowledge Base Loaded")
+    st.sidebar.caption(f"Index snapshot: {snapshot['version']}")
+    st.sidebar.caption(format_memory(process_memory()))
 except:
     st.sidebar.error("❌ Clinical trials index not found. Run trials_indexer.py")
     st.stop()
@@ -38,12 +39,12 @@ except:
 query = st.text_input("Search clinical trials (condition, drug, phase, outcome)")
 
 if st.button("🚀 Run Trials Intelligence") and query:
-    q_emb = embedder.encode([query])
-    D, I = index.search(np.array(q_emb), 5)
+    q_emb = encode([query])
+    rows = search_snapshot(snapshot, q_emb, 5)
 
     st.subheader("🧪 Clinical Trials Evidence")
 
-    for i in I[0]:
+    for i in rows:
         st.markdown(documents[i])
         st.info(sources[i])
 
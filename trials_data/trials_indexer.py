@@ -1,18 +1,40 @@
 import os
+import sys
 import json
-import pickle
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_server import encode
+from vector_store import (
+    save_snapshot, upsert_snapshot, load_tombstones, import_legacy, read_legacy_cache
+)
+from dedup import files_oldest_first, newest_by_key
 
 DATA_DIR = "research_ai/trials_data"
 VECTOR_DIR = "research_ai/vector_trials"
-INDEX_FILE = os.path.join(VECTOR_DIR, "trials.index")
-CACHE_FILE = os.path.join(VECTOR_DIR, "trials.pkl")
+LEGACY_INDEX_FILE = os.path.join(VECTOR_DIR, "trials.index")
+LEGACY_CACHE_FILE = os.path.join(VECTOR_DIR, "trials.pkl")
 
 os.makedirs(VECTOR_DIR, exist_ok=True)
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+
+def _study_fields(study):
+    # API v2 nests fields under protocolSection; the retired study_fields
+    # endpoint (older files on disk) returned flat single-item lists
+    if "protocolSection" in study:
+        protocol = study["protocolSection"]
+        return (
+            protocol.get("identificationModule", {}).get("nctId", ""),
+            protocol.get("identificationModule", {}).get("briefTitle", ""),
+            (protocol.get("conditionsModule", {}).get("conditions") or [""])[0],
+            (protocol.get("designModule", {}).get("phases") or [""])[0],
+            protocol.get("statusModule", {}).get("overallStatus", "")
+        )
+
+    return tuple(
+        study.get(field, [""])[0]
+        for field in ("NCTId", "BriefTitle", "Condition", "Phase", "OverallStatus")
+    )
 
 
 def parse_trials(file_path):
@@ -22,14 +44,13 @@ def parse_trials(file_path):
     docs = []
     sources = []
 
-    studies = data["StudyFieldsResponse"]["StudyFields"]
+    if "studies" in data:
+        studies = data["studies"]
+    else:
+        studies = data["StudyFieldsResponse"]["StudyFields"]
 
     for study in studies:
-        nct = study.get("NCTId", [""])[0]
-        title = study.get("BriefTitle", [""])[0]
-        condition = study.get("Condition", [""])[0]
-        phase = study.get("Phase", [""])[0]
-        status = study.get("OverallStatus", [""])[0]
+        nct, title, condition, phase, status = _study_fields(study)
 
         text = f"""
 Trial ID: {nct}
@@ -46,36 +67,64 @@ Status: {status}
     return docs, sources
 
 
+def read_records(paths):
+    tombstones = load_tombstones(VECTOR_DIR)
+    for path in paths:
+        d, s = parse_trials(path)
+        for doc, source in zip(d, s):
+            nct = source.replace("NCT ID:", "").strip()
+            if nct not in tombstones:
+                yield nct, doc, source
+
+
 def build_trials_index():
-    documents = []
-    sources = []
+    import faiss
 
-    for file in os.listdir(DATA_DIR):
-        if file.endswith(".json"):
-            d, s = parse_trials(os.path.join(DATA_DIR, file))
-            documents.extend(d)
-            sources.extend(s)
+    documents, sources, keys, duplicates = newest_by_key(
+        read_records(files_oldest_first(DATA_DIR, ".json"))
+    )
 
     if not documents:
         print("❌ No trials found.")
         return
 
+    if duplicates:
+        print(f"🧹 Skipped {duplicates} duplicate NCT IDs (kept newest).")
+
     print(f"🧠 Indexing {len(documents)} clinical trials...")
 
-    embeddings = model.encode(documents, batch_size=16)
+    embeddings = encode(documents)
     dim = embeddings.shape[1]
 
     index = faiss.IndexFlatL2(dim)
     index.add(np.array(embeddings))
 
-    faiss.write_index(index, INDEX_FILE)
-
-    with open(CACHE_FILE, "wb") as f:
-        pickle.dump({"documents": documents, "sources": sources}, f)
+    version = save_snapshot(VECTOR_DIR, index, documents, sources, keys,
+                            note=f"build of {len(documents)} clinical trials")
+    print(f"📦 Snapshot {version} is now live.")
 
     print("✅ Clinical trials knowledge index built successfully.")
 
 
+def update_trials_index(paths):
+    """Add or replace the clinical trials in the given files without re-encoding the rest."""
+    documents, sources, keys, _ = newest_by_key(read_records(paths))
+
+    if not documents:
+        print("No new clinical trials to index.")
+        return None
+
+    print(f"🧠 Indexing {len(documents)} new or updated clinical trials...")
+
+    embeddings = encode(documents)
+    # Carry over a pre-snapshot index so the upsert does not start from empty
+    import_legacy(VECTOR_DIR, LEGACY_INDEX_FILE, lambda: read_legacy_cache(LEGACY_CACHE_FILE, "NCT ID:"))
+    version = upsert_snapshot(VECTOR_DIR, embeddings, documents, sources, keys,
+                              note=f"sync of {len(documents)} clinical trials")
+    print(f"📦 Snapshot {version} is now live.")
+    return version
+
+
 if __name__ == "__main__":
     build_trials_index()
 
@@ -6,30 +6,69 @@ from datetime import datetime
 SAVE_DIR = "research_ai/trials_data"
 os.makedirs(SAVE_DIR, exist_ok=True)
 
-BASE_URL = "https://clinicaltrials.gov/api/query/study_fields"
+BASE_URL = os.getenv("MEDCOPILOT_CTGOV_URL", "https://clinicaltrials.gov/api/v2/studies")
+PAGE_SIZE = 100
 
 
-def fetch_trials(condition, max_results=50):
+def iter_trials_pages(condition, max_results=50, updated_since=None):
+    """Fetch trials for a condition page by page, yielding each saved JSON path.
+
+    updated_since is a datetime.date; only trials updated on/after it are
+    returned. Results are paged with the v2 API's pageToken, PAGE_SIZE studies
+    per file, until max_results (or every match, if None) is reached. Pages
+    saved before an error have already been yielded.
+    """
     print(f"🔍 Searching ClinicalTrials.gov for: {condition}")
 
     params = {
-        "expr": condition,
-        "fields": "NCTId,BriefTitle,Condition,Phase,EnrollmentCount,OverallStatus",
-        "min_rnk": 1,
-        "max_rnk": max_results,
-        "fmt": "json"
+        "query.cond": condition,
+        "fields": "NCTId,BriefTitle,Condition,Phase,EnrollmentCount,OverallStatus,LastUpdatePostDate",
+        "countTotal": "true",
+        "format": "json"
     }
 
-    response = requests.get(BASE_URL, params=params)
-    data = response.json()
+    if updated_since:
+        params["query.term"] = f"AREA[LastUpdatePostDate]RANGE[{updated_since.isoformat()},MAX]"
+
+    # Delta fetches get a timestamp so repeated runs on one day don't overwrite each other
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S" if updated_since else "%Y%m%d")
+    page = 0
+    fetched = 0
+
+    while max_results is None or fetched < max_results:
+        params["pageSize"] = PAGE_SIZE if max_results is None else min(PAGE_SIZE, max_results - fetched)
+
+        response = requests.get(BASE_URL, params=params, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+
+        if not page:
+            print(f"📄 Found {data.get('totalCount', 0)} trials")
+
+        studies = data.get("studies") or []
+        if not studies:
+            break
+
+        page += 1
+        filename = f"trials_{condition.replace(' ', '_')}_{stamp}_p{page}.json"
+        path = os.path.join(SAVE_DIR, filename)
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+        print(f"✅ Saved: {path}")
+        yield path
+        fetched += len(studies)
 
-    filename = f"trials_{condition.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.json"
-    path = os.path.join(SAVE_DIR, filename)
+        if not data.get("nextPageToken"):
+            break
+        params["pageToken"] = data["nextPageToken"]
+        params.pop("countTotal", None)
 
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
 
-    print(f"✅ Saved: {path}")
+def fetch_trials(condition, max_results=50, updated_since=None):
+    """Fetch trials for a condition; returns the saved JSON paths (empty if none matched)."""
+    return list(iter_trials_pages(condition, max_results, updated_since))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,543 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+import contextlib
+from datetime import datetime
+
+try:
+    import fcntl
+    import resource
+except ImportError:  # Windows
+    fcntl = None
+    resource = None
+    import msvcrt
+
+# FAISS index I/O shared by the Streamlit pages and indexers.
+#
+# Indexes are plain IndexFlatL2 files. Readers open them memory-mapped and
+# read-only so every Streamlit process on the host shares the same
+# page-cache-backed vectors instead of holding a private copy.
+#
+#   python vector_store.py --rss <index file>
+#   python vector_store.py --list <store dir>
+#   python vector_store.py --delete <store dir> <key> [<key> ...]
+#   python vector_store.py --compact <store dir>
+#   python vector_store.py --rollback <store dir> <version>
+#   python vector_store.py --prune <store dir> [<versions to keep>]
+
+
+def _mmap_flags(faiss):
+    # IO_FLAG_MMAP_IFC maps IndexFlat codes directly (newer faiss releases);
+    # IO_FLAG_MMAP covers on-disk inverted lists on older ones.
+    flags = []
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flags.append(faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    flags.append(faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return flags
+
+
+def write_index(index, path):
+    import faiss
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    # Atomic swap so processes that have the old file mapped keep a valid view
+    os.replace(tmp_path, path)
+
+
+def read_index(path, mmap=True):
+    import faiss
+
+    if mmap:
+        for flags in _mmap_flags(faiss):
+            try:
+                return faiss.read_index(path, flags)
+            except RuntimeError:
+                continue
+    return faiss.read_index(path)
+
+
+# ===================== SNAPSHOTS =====================
+#
+# <store_dir>/
+#   CURRENT              name of the live snapshot, e.g. "v0003"
+#   tombstones.json      deleted keys (PMID, NCT ID, PDF file name)
+#   snapshots/v0003/     index.faiss, docs.pkl, manifest.json
+#
+# Every build writes a new snapshot; the last SNAPSHOT_RETENTION stay on
+# disk as rollback points. Deletes only add a tombstone, search filters tombstoned keys out
+# immediately, and compaction writes a new snapshot without them.
+#
+# Writers (indexers, the sync daemon, background compaction) hold the
+# store's .lock file for their whole load -> build -> swap cycle.
+
+SNAPSHOT_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+TOMBSTONE_FILE = "tombstones.json"
+LOCK_FILE = ".lock"
+LEGACY_SKIP_FILE = "legacy_skipped"
+COMPACTION_THRESHOLD = 0.1
+SNAPSHOT_RETENTION = int(os.getenv("MEDCOPILOT_SNAPSHOT_RETENTION", "5"))
+
+_held_locks = threading.local()
+_tombstone_cache = {}
+
+
+@contextlib.contextmanager
+def store_lock(store_dir):
+    """Exclusive per-store writer lock; re-entrant within a thread."""
+    held = _held_locks.__dict__.setdefault("stores", set())
+    key = os.path.abspath(store_dir)
+    if key in held:
+        yield
+        return
+
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, LOCK_FILE), "a+") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def list_snapshots(store_dir):
+    root = os.path.join(store_dir, SNAPSHOT_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if v.startswith("v") and not v.endswith(".tmp"))
+
+
+def current_version(store_dir):
+    path = os.path.join(store_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def save_snapshot(store_dir, index, documents, sources, keys, note=""):
+    with store_lock(store_dir):
+        return _save_snapshot_locked(store_dir, index, documents, sources, keys, note)
+
+
+def _save_snapshot_locked(store_dir, index, documents, sources, keys, note):
+    existing = list_snapshots(store_dir)
+    version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+
+    root = os.path.join(store_dir, SNAPSHOT_DIR)
+    os.makedirs(root, exist_ok=True)
+    final_dir = os.path.join(root, version)
+    # Hidden, uniquely named staging dir; list_snapshots() never sees it
+    tmp_dir = tempfile.mkdtemp(prefix=f".{version}-", suffix=".tmp", dir=root)
+
+    write_index(index, os.path.join(tmp_dir, "index.faiss"))
+
+    with open(os.path.join(tmp_dir, "docs.pkl"), "wb") as f:
+        pickle.dump({"documents": documents, "sources": sources, "keys": keys}, f)
+
+    manifest = {
+        "version": version,
+        "parent": current_version(store_dir),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "count": int(index.ntotal),
+        "dim": int(index.d),
+        "note": note
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_dir, final_dir)
+    _write_atomic(os.path.join(store_dir, CURRENT_FILE), version)
+    prune_snapshots(store_dir)
+    return version
+
+
+def prune_snapshots(store_dir, keep=SNAPSHOT_RETENTION):
+    """Delete all but the newest `keep` snapshots and the one in CURRENT.
+
+    Processes still serving a deleted snapshot keep their open/mapped files.
+    """
+    with store_lock(store_dir):
+        root = os.path.join(store_dir, SNAPSHOT_DIR)
+        versions = list_snapshots(store_dir)
+        retained = set(versions[-keep:] if keep > 0 else []) | {current_version(store_dir)}
+
+        removed = [v for v in versions if v not in retained]
+        for version in removed:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+        # Staging dirs left behind by a crashed writer (no writer is active under the lock)
+        if os.path.isdir(root):
+            for name in os.listdir(root):
+                if name.startswith(".") and name.endswith(".tmp"):
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    return removed
+
+
+def load_snapshot(store_dir, version=None):
+    version = version or current_version(store_dir)
+    if version is None:
+        raise FileNotFoundError(f"No index snapshot in {store_dir}")
+
+    snap_dir = os.path.join(store_dir, SNAPSHOT_DIR, version)
+    with open(os.path.join(snap_dir, "docs.pkl"), "rb") as f:
+        data = pickle.load(f)
+    with open(os.path.join(snap_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    return {
+        "version": version,
+        "manifest": manifest,
+        "index": read_index(os.path.join(snap_dir, "index.faiss")),
+        "documents": data["documents"],
+        "sources": data["sources"],
+        "keys": data["keys"],
+        "store_dir": store_dir
+    }
+
+
+def upsert_snapshot(store_dir, embeddings, documents, sources, keys, note=""):
+    """Write a new snapshot with these documents added, replacing rows with the same key.
+
+    Existing vectors are copied from the current index, so only the new
+    documents need encoding. Tombstoned rows are dropped along the way.
+    """
+    with store_lock(store_dir):
+        return _upsert_snapshot_locked(store_dir, embeddings, documents, sources, keys, note)
+
+
+def _upsert_snapshot_locked(store_dir, embeddings, documents, sources, keys, note):
+    import faiss
+    import numpy as np
+
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    all_documents, all_sources, all_keys = [], [], []
+
+    version = current_version(store_dir)
+    if version is not None:
+        snapshot = load_snapshot(store_dir, version)
+        replaced = {k for k in keys if k} | load_tombstones(store_dir)
+        keep = [i for i, key in enumerate(snapshot["keys"]) if key not in replaced]
+
+        if keep:
+            vectors = snapshot["index"].reconstruct_n(0, snapshot["index"].ntotal)
+            index.add(np.ascontiguousarray(vectors[keep], dtype="float32"))
+
+        all_documents = [snapshot["documents"][i] for i in keep]
+        all_sources = [snapshot["sources"][i] for i in keep]
+        all_keys = [snapshot["keys"][i] for i in keep]
+
+    index.add(embeddings)
+
+    return _save_snapshot_locked(
+        store_dir,
+        index,
+        all_documents + list(documents),
+        all_sources + list(sources),
+        all_keys + list(keys),
+        note
+    )
+
+
+def read_legacy_cache(cache_path, key_prefix):
+    """Documents, sources and keys from a pre-snapshot pickle ("PMID: 123" -> "123")."""
+    with open(cache_path, "rb") as f:
+        data = pickle.load(f)
+    sources = data["sources"]
+    keys = [source.replace(key_prefix, "").strip() for source in sources]
+    return data["documents"], sources, keys
+
+
+def import_legacy(store_dir, index_path, load_documents):
+    """One-time import of a pre-snapshot index file as the store's first snapshot.
+
+    load_documents() returns (documents, sources, keys) in the legacy index's
+    row order. Does nothing once the store has a snapshot, or if this exact
+    legacy file already failed to import (recorded in LEGACY_SKIP_FILE).
+    """
+    if current_version(store_dir) is not None or not os.path.exists(index_path):
+        return None
+
+    stat = os.stat(index_path)
+    stamp = f"{os.path.basename(index_path)} {stat.st_mtime_ns} {stat.st_size}"
+    marker = os.path.join(store_dir, LEGACY_SKIP_FILE)
+
+    def already_skipped():
+        if not os.path.exists(marker):
+            return False
+        with open(marker, "r", encoding="utf-8") as f:
+            return f.read() == stamp
+
+    if already_skipped():
+        return None
+
+    with store_lock(store_dir):
+        if current_version(store_dir) is not None or already_skipped():
+            return None
+
+        index = read_index(index_path, mmap=False)
+        documents, sources, keys = load_documents()
+        if len(documents) != index.ntotal:
+            print(f"❌ Legacy index {index_path} has {index.ntotal} vectors but "
+                  f"{len(documents)} documents; rebuild the index instead.")
+            # Remember the failure so every page rerun does not repeat it
+            _write_atomic(marker, stamp)
+            return None
+
+        version = _save_snapshot_locked(
+            store_dir, index, documents, sources, keys,
+            f"import of legacy {os.path.basename(index_path)}"
+        )
+        print(f"📦 Imported legacy index {index_path} as {version}")
+        return version
+
+
+def rollback(store_dir, version):
+    with store_lock(store_dir):
+        if version not in list_snapshots(store_dir):
+            raise ValueError(f"Unknown snapshot '{version}' in {store_dir}")
+        _write_atomic(os.path.join(store_dir, CURRENT_FILE), version)
+
+
+def _tombstones_with_stamp(store_dir):
+    # tombstones.json is only ever replaced atomically, so (inode, mtime, size)
+    # identifies its contents and the file is re-read only when it changes
+    path = os.path.join(store_dir, TOMBSTONE_FILE)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None, frozenset()
+
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _tombstone_cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached
+
+    with open(path, "r", encoding="utf-8") as f:
+        cached = (stamp, frozenset(json.load(f)))
+    _tombstone_cache[path] = cached
+    return cached
+
+
+def load_tombstones(store_dir):
+    return _tombstones_with_stamp(store_dir)[1]
+
+
+def add_tombstones(store_dir, keys):
+    with store_lock(store_dir):
+        tombstones = load_tombstones(store_dir) | {k for k in keys if k}
+        _write_atomic(os.path.join(store_dir, TOMBSTONE_FILE), json.dumps(sorted(tombstones), indent=2))
+    return tombstones
+
+
+def remove_tombstones(store_dir, keys):
+    if not os.path.isdir(store_dir):
+        return set()
+    with store_lock(store_dir):
+        current = load_tombstones(store_dir)
+        tombstones = current - set(keys)
+        if tombstones == current:
+            return set(current)
+        _write_atomic(os.path.join(store_dir, TOMBSTONE_FILE), json.dumps(sorted(tombstones), indent=2))
+    return tombstones
+
+
+def search_snapshot(snapshot, query_emb, k):
+    """Row ids of the k nearest live documents, skipping tombstoned keys."""
+    import numpy as np
+
+    index = snapshot["index"]
+    keys = snapshot["keys"]
+    stamp, tombstones = _tombstones_with_stamp(snapshot["store_dir"])
+
+    # Counting deleted rows is linear in the corpus; do it once per
+    # (snapshot version, tombstone file) rather than on every query
+    cache_key = (snapshot["version"], stamp)
+    cached = snapshot.get("deleted_count")
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, sum(1 for key in keys if key in tombstones) if tombstones else 0)
+        snapshot["deleted_count"] = cached
+
+    fetch = min(index.ntotal, k + cached[1])
+    if fetch <= 0:
+        return []
+
+    D, I = index.search(np.asarray(query_emb, dtype="float32"), fetch)
+
+    rows = []
+    for i in I[0]:
+        if 0 <= i < len(keys) and keys[i] not in tombstones:
+            rows.append(int(i))
+        if len(rows) == k:
+            break
+    return rows
+
+
+def deleted_fraction(snapshot, tombstones):
+    keys = snapshot["keys"]
+    if not keys:
+        return 0.0
+    return sum(1 for key in keys if key in tombstones) / len(keys)
+
+
+def compact(store_dir, threshold=COMPACTION_THRESHOLD, force=False):
+    """Write a new snapshot without tombstoned documents once enough are deleted.
+
+    Vectors are copied from the current index, so nothing is re-encoded.
+    Returns the new version, or None if compaction was not needed.
+    """
+    with store_lock(store_dir):
+        return _compact_locked(store_dir, threshold, force)
+
+
+def _compact_locked(store_dir, threshold, force):
+    import faiss
+    import numpy as np
+
+    version = current_version(store_dir)
+    if version is None:
+        return None
+
+    snapshot = load_snapshot(store_dir, version)
+    tombstones = load_tombstones(store_dir)
+    fraction = deleted_fraction(snapshot, tombstones)
+    if fraction == 0 or (fraction < threshold and not force):
+        return None
+
+    index = snapshot["index"]
+    live = [i for i, key in enumerate(snapshot["keys"]) if key not in tombstones]
+    vectors = index.reconstruct_n(0, index.ntotal)
+
+    compacted = faiss.IndexFlatL2(index.d)
+    if live:
+        compacted.add(np.ascontiguousarray(vectors[live], dtype="float32"))
+
+    return _save_snapshot_locked(
+        store_dir,
+        compacted,
+        [snapshot["documents"][i] for i in live],
+        [snapshot["sources"][i] for i in live],
+        [snapshot["keys"][i] for i in live],
+        f"compaction of {version}: dropped {len(snapshot['keys']) - len(live)} documents"
+    )
+
+
+def compact_in_background(store_dir, threshold=COMPACTION_THRESHOLD):
+    worker = threading.Thread(target=compact, args=(store_dir, threshold), daemon=True)
+    worker.start()
+    return worker
+
+
+# ===================== MEMORY REPORT =====================
+
+def process_memory():
+    """Return RSS of this process in MB, split into private and file-backed pages."""
+    usage = {"rss": 0.0, "anon": 0.0, "file": 0.0}
+    keys = {"VmRSS:": "rss", "RssAnon:": "anon", "RssFile:": "file"}
+
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in keys:
+                    usage[keys[parts[0]]] = int(parts[1]) / 1024.0
+    except OSError:
+        if resource is None:
+            return usage
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["rss"] = peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+    return usage
+
+
+def format_memory(usage):
+    return (f"RSS {usage['rss']:.1f} MB "
+            f"(private {usage['anon']:.1f} MB, shared file {usage['file']:.1f} MB)")
+
+
+def rss_report(path):
+    import numpy as np
+
+    print(f"📊 Memory report for {path}")
+    print(f"   before load:    {format_memory(process_memory())}")
+
+    for label, mmap in [("mmap read", True), ("private read", False)]:
+        index = read_index(path, mmap=mmap)
+        # Touch every vector so resident pages are counted
+        index.search(np.zeros((1, index.d), dtype="float32"), 1)
+        print(f"   {label:<15} {format_memory(process_memory())}  ({index.ntotal} vectors)")
+        del index
+
+
+def print_snapshots(store_dir):
+    current = current_version(store_dir)
+    tombstones = load_tombstones(store_dir)
+    print(f"📦 Snapshots in {store_dir} ({len(tombstones)} tombstones)")
+
+    for version in list_snapshots(store_dir):
+        path = os.path.join(store_dir, SNAPSHOT_DIR, version, "manifest.json")
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        marker = "*" if version == current else " "
+        print(f" {marker} {version}  {manifest['created']}  {manifest['count']} docs  {manifest['note']}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    args = sys.argv[2:]
+
+    if command == "--rss" and len(args) == 1:
+        rss_report(args[0])
+    elif command == "--list" and len(args) == 1:
+        print_snapshots(args[0])
+    elif command == "--delete" and len(args) >= 2:
+        add_tombstones(args[0], args[1:])
+        print(f"🗑 Tombstoned {len(args) - 1} keys")
+        version = compact(args[0])
+        if version:
+            print(f"✅ Compacted into {version}")
+    elif command == "--compact" and len(args) == 1:
+        version = compact(args[0], force=True)
+        print(f"✅ Compacted into {version}" if version else "Nothing to compact")
+    elif command == "--prune" and len(args) in (1, 2):
+        keep = int(args[1]) if len(args) == 2 else SNAPSHOT_RETENTION
+        removed = prune_snapshots(args[0], keep)
+        print(f"🧹 Removed {len(removed)} snapshots: {', '.join(removed) or '-'}")
+    elif command == "--rollback" and len(args) == 2:
+        rollback(args[0], args[1])
+        print(f"✅ {args[0]} now serving {args[1]}")
+    else:
+        print("Usage: python vector_store.py --rss <index file> | --list <store dir> | "
+              "--delete <store dir> <key>... | --compact <store dir> | --rollback <store dir> <version> | "
+              "--prune <store dir> [<keep>]")